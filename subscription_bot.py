@@ -15,15 +15,39 @@ TELEGRAM_BOT_TOKEN   # Bot token from BotFather
 TARGET_CHAT_ID       # ID of the channel or group to check membership against
 MATERIAL_TEXT        # (optional) Text to send when the user is subscribed
 MATERIAL_FILE_PATH   # (optional) Path to a file to send when subscribed
+MATERIAL_PRELOAD_LIMIT # (optional) Max file size in bytes kept in memory (default 20 MiB)
 CHANNEL_INVITE_LINK  # (optional) URL to invite users to subscribe
+REDIS_URL            # (optional) Redis URL for a membership cache shared by workers
+CONNECTION_POOL_SIZE # (optional) Connections for outgoing API calls (default 32)
+POOL_TIMEOUT         # (optional) Seconds to wait for a free connection (default 10)
+PUBLIC_URL           # (optional) Public HTTPS URL of the bot; enables webhook mode
+PORT                 # (optional) Port for the webhook server to listen on (default 8443)
+WEBHOOK_SECRET       # (optional) Secret token Telegram sends with webhook updates
+FILE_ID_CACHE_PATH   # (optional) Where to save the uploaded file's file_id
+SUBSCRIBERS_DB_PATH  # (optional) SQLite file remembering known subscribers
+LOG_LEVEL            # (optional) DEBUG, INFO, WARNING (default) or ERROR
 ```
 
 Only one of ``MATERIAL_TEXT`` or ``MATERIAL_FILE_PATH`` is required.  If
-``MATERIAL_FILE_PATH`` points to a local file, it will be read and sent
-using ``send_document``.  If ``MATERIAL_TEXT`` is provided, it will be sent
-as a plain text message.  ``CHANNEL_INVITE_LINK`` should be a t.me link or
+``MATERIAL_FILE_PATH`` is set, it must point to a local file, which will be
+read at startup and sent using ``send_document``.  Files larger than
+``MATERIAL_PRELOAD_LIMIT`` are not kept in memory but read from disk whenever
+they need to be uploaded.  After the first upload the file is re-sent by its
+Telegram ``file_id``, which is saved to ``FILE_ID_CACHE_PATH``
+(``material_file_id.json`` by default) or to Redis, so that later runs don't
+upload it again either.  If ``MATERIAL_TEXT`` is provided, it will be sent as
+a plain text message.  ``CHANNEL_INVITE_LINK`` should be a t.me link or
 username of your channel to direct users who aren’t subscribed.
 
+Membership checks are cached for a short time.  By default the cache lives
+in the bot process; set ``REDIS_URL`` (e.g. ``redis://localhost:6379/0``) to
+keep it in Redis instead, so that several bot processes share one cache.
+The entries expire on their own, so an LFU eviction policy is a good fit
+for the Redis instance (``maxmemory-policy allkeys-lfu``).  This requires
+the ``redis`` package.  Without Redis, users known to be subscribed are
+remembered across restarts in the SQLite database ``SUBSCRIBERS_DB_PATH``
+(``subscribers.sqlite3`` by default).
+
 Example usage
 -------------
 
@@ -39,10 +63,15 @@ CHANNEL_INVITE_LINK=https://t.me/your_channel
 Then install dependencies and run the bot:
 
 ```sh
-pip install python-telegram-bot python-dotenv
+pip install -r requirements.txt
 python subscription_bot.py
 ```
 
+By default the bot fetches updates by long polling.  If ``PUBLIC_URL`` is
+set (e.g. ``https://bot.example.com``), it runs a webhook server on ``PORT``
+instead and Telegram delivers updates to ``PUBLIC_URL/<token>``.  Webhook
+mode requires ``pip install "python-telegram-bot[webhooks]"``.
+
 The bot will respond to the ``/start`` command with a greeting and to the
 ``/get`` command by checking the user’s subscription status and sending the
 material if appropriate.  If the user is not subscribed, a prompt will be
@@ -50,32 +79,347 @@ sent with your channel’s invite link.
 """
 
 import asyncio
+import json
 import logging
 import os
+import sys
+import time
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple, Union
 
+import aiofiles
+import aiofiles.os
+import aiosqlite
+import httpx
 from dotenv import load_dotenv
 from telegram import Update
-from telegram.constants import ChatMemberStatus, ParseMode
-from telegram.ext import (Application, ApplicationBuilder, CommandHandler,
-                          ContextTypes)
+from telegram.constants import ChatAction, ChatMemberStatus
+from telegram.error import BadRequest, NetworkError, TimedOut
+from telegram.ext import (AIORateLimiter, Application, ApplicationBuilder,
+                          ChatMemberHandler, CommandHandler, ContextTypes,
+                          Defaults)
+from telegram.request import HTTPXRequest
+
+# Redis is only needed when REDIS_URL is set, so don't require it otherwise.
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - depends on the environment
+    aioredis = None
+
+    class RedisError(Exception):
+        """Placeholder so that ``except RedisError`` works without redis."""
 
 
 # Configure basic logging so that important information is printed to the
 # console.  This is helpful for debugging and monitoring the bot’s
-# behaviour.  You can adjust the log level to logging.INFO or DEBUG for
-# more verbose output.
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
+# behaviour.  Set LOG_LEVEL to INFO or DEBUG for more verbose output; the
+# default of WARNING keeps logging cheap in production.  LOG_LEVEL may come
+# from .env, so load it before looking.
+load_dotenv()
+_LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+_LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+if not isinstance(logging.getLevelName(_LOG_LEVEL), int):
+    raise RuntimeError(
+        f"LOG_LEVEL must be one of DEBUG, INFO, WARNING or ERROR, not {_LOG_LEVEL!r}"
+    )
+logging.basicConfig(format=_LOG_FORMAT, level=_LOG_LEVEL)
+
+# The bot's own messages are written straight to stderr instead of being
+# passed on to the root logger's handlers.
 logger = logging.getLogger(__name__)
+_log_handler = logging.StreamHandler(sys.stderr)
+_log_handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+logger.addHandler(_log_handler)
+logger.setLevel(_LOG_LEVEL)
+logger.propagate = False
+
+# The level is fixed at startup, so check once whether debug messages are
+# wanted and skip building their arguments otherwise.
+_DEBUG = logger.isEnabledFor(logging.DEBUG)
+
+
+# Cache of membership statuses so that repeated /get calls from the same user
+# don't each cost a get_chat_member round-trip.  Subscribed users are cached
+# for MEMBERSHIP_CACHE_TTL seconds; users who are not subscribed only for
+# MEMBERSHIP_NEGATIVE_TTL seconds, so that someone who has just joined the
+# channel doesn't have to wait long.
+#
+# If REDIS_URL is configured the cache lives in Redis under the key
+# ``sub:{target_chat_id}:{user_id}``, so that every worker process shares it
+# and an invalidation made by one worker is seen by all of them.  Otherwise
+# it is kept in-process in _membership_cache, which maps user_id to a tuple
+# of (status, expires_at), where expires_at is a time.monotonic() timestamp.
+# All access to the dict happens on the event loop without awaiting in
+# between, so no lock is needed.
+MEMBERSHIP_CACHE_TTL = 30
+MEMBERSHIP_NEGATIVE_TTL = 5
+MEMBERSHIP_CACHE_MAXSIZE = 100_000
+_membership_cache: Dict[int, Tuple[str, float]] = {}
+
+
+def _membership_key(target_chat_id, user_id: int) -> str:
+    """Return the Redis key under which a user's status is cached."""
+    return f"sub:{target_chat_id}:{user_id}"
+
+
+def _membership_ttl(status: str) -> int:
+    """Return how long, in seconds, a given status may be cached."""
+    if status in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+        return MEMBERSHIP_NEGATIVE_TTL
+    return MEMBERSHIP_CACHE_TTL
+
+
+async def _get_cached_status(
+    redis_client, target_chat_id, user_id: int
+) -> Optional[str]:
+    """Return the cached membership status of a user, or None on a miss."""
+    if redis_client is not None:
+        try:
+            return await redis_client.get(_membership_key(target_chat_id, user_id))
+        except RedisError as exc:
+            # A broken cache must not break /get; just ask Telegram instead.
+            logger.warning("Redis lookup failed for user %s: %s", user_id, exc)
+            return None
+
+    entry = _membership_cache.get(user_id)
+    if entry is None:
+        return None
+    status, expires_at = entry
+    if expires_at <= time.monotonic():
+        del _membership_cache[user_id]
+        return None
+    return status
+
+
+async def _cache_status(
+    redis_client, target_chat_id, user_id: int, status: str
+) -> None:
+    """Remember a user's membership status for the appropriate TTL."""
+    ttl = _membership_ttl(status)
+    if redis_client is not None:
+        try:
+            await redis_client.set(
+                _membership_key(target_chat_id, user_id), str(status), ex=ttl
+            )
+        except RedisError as exc:
+            logger.warning("Redis store failed for user %s: %s", user_id, exc)
+        return
+
+    now = time.monotonic()
+    if len(_membership_cache) >= MEMBERSHIP_CACHE_MAXSIZE:
+        # Drop expired entries first; if that's not enough, start over.
+        for key in [k for k, (_, exp) in _membership_cache.items() if exp <= now]:
+            del _membership_cache[key]
+        if len(_membership_cache) >= MEMBERSHIP_CACHE_MAXSIZE:
+            _membership_cache.clear()
+    _membership_cache[user_id] = (status, now + ttl)
 
 
+async def _invalidate_status(
+    redis_client, target_chat_id, user_id: Optional[int] = None
+) -> None:
+    """Forget the cached status of one user, or of everyone if user_id is None."""
+    if redis_client is not None:
+        try:
+            if user_id is not None:
+                await redis_client.delete(_membership_key(target_chat_id, user_id))
+            else:
+                # Delete a whole SCAN page per round-trip instead of one key
+                # at a time; UNLINK frees the memory in the background.
+                pattern = _membership_key(target_chat_id, "*")
+                cursor = 0
+                while True:
+                    cursor, keys = await redis_client.scan(
+                        cursor, match=pattern, count=1000
+                    )
+                    if keys:
+                        await redis_client.unlink(*keys)
+                    if cursor == 0:
+                        break
+        except RedisError as exc:
+            logger.warning("Redis invalidation failed: %s", exc)
+        return
+
+    if user_id is not None:
+        _membership_cache.pop(user_id, None)
+    else:
+        _membership_cache.clear()
+
+
+# Statuses that count as being subscribed.  Older versions of the library
+# call the owner status CREATOR, so include whichever names exist.
+_SUBSCRIBED_STATUSES = frozenset(
+    s
+    for s in (
+        getattr(ChatMemberStatus, "MEMBER", None),
+        getattr(ChatMemberStatus, "ADMINISTRATOR", None),
+        getattr(ChatMemberStatus, "OWNER", None),
+        getattr(ChatMemberStatus, "CREATOR", None),
+    )
+    if s is not None
+)
+
+
+def _is_subscribed(status: str) -> bool:
+    """Return True if a chat member status counts as being subscribed."""
+    return status in _SUBSCRIBED_STATUSES
+
+
+# Users known to be subscribed, kept up to date from chat_member updates that
+# Telegram pushes to the bot, so that /get can usually be answered without any
+# API call.  With Redis they are stored in the sorted set
+# ``subscribers:{target_chat_id}``, scored by when they were last confirmed,
+# and shared by all workers.  Otherwise they live in bot_data["subscribers"],
+# a dict of user_id to that time, and are saved to a SQLite database
+# (SUBSCRIBERS_DB_PATH), so that a restarted bot doesn't have to look every
+# user up again.
+# A chat_member update can be missed, e.g. while the bot is down for longer
+# than Telegram keeps updates, so an entry is only trusted for
+# SUBSCRIBER_RECHECK_AGE seconds; after that the user is looked up again.
+# Telegram only sends chat_member updates to bots that are administrators of
+# the chat, which is also required for get_chat_member on channels.
+SUBSCRIBER_RECHECK_AGE = 24 * 60 * 60
+
+
+def _subscribers_key(bot_data: dict) -> str:
+    """Return the Redis key of the sorted set of known subscribers."""
+    return f"subscribers:{bot_data['config'].target_chat_id}"
+
+
+async def _open_subscribers_db(bot_data: dict) -> aiosqlite.Connection:
+    """Open the subscribers database and load the known subscribers from it."""
+    config: Config = bot_data["config"]
+    db = await aiosqlite.connect(config.subscribers_db_path)
+    # WAL lets the occasional write go ahead without blocking reads, and
+    # NORMAL synchronisation is safe with WAL while avoiding an fsync per
+    # commit.
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS subscribers ("
+        " chat_id TEXT NOT NULL,"
+        " user_id INTEGER NOT NULL,"
+        " status TEXT NOT NULL,"
+        " updated_at INTEGER NOT NULL,"
+        " PRIMARY KEY (chat_id, user_id))"
+    )
+    await db.commit()
+    # Entries too old to be trusted are left out; those users are simply
+    # looked up again the next time they use /get.
+    placeholders = ", ".join("?" * len(_SUBSCRIBED_STATUSES))
+    query = (
+        "SELECT user_id, updated_at FROM subscribers"
+        f" WHERE chat_id = ? AND status IN ({placeholders}) AND updated_at > ?"
+    )
+    params = [
+        str(config.target_chat_id),
+        *map(str, _SUBSCRIBED_STATUSES),
+        int(time.time() - SUBSCRIBER_RECHECK_AGE),
+    ]
+    async with db.execute(query, params) as cursor:
+        bot_data["subscribers"].update([(row[0], row[1]) async for row in cursor])
+    logger.info("Loaded %d known subscribers", len(bot_data["subscribers"]))
+    return db
+
+
+async def _is_known_subscriber(bot_data: dict, user_id: int) -> bool:
+    """Return True if the user was recently confirmed to be subscribed."""
+    redis_client = bot_data.get("redis")
+    if redis_client is not None:
+        try:
+            confirmed_at = await redis_client.zscore(
+                _subscribers_key(bot_data), user_id
+            )
+        except RedisError as exc:
+            logger.warning("Redis lookup failed for user %s: %s", user_id, exc)
+            return False
+    else:
+        confirmed_at = bot_data["subscribers"].get(user_id)
+    return (
+        confirmed_at is not None
+        and time.time() - confirmed_at < SUBSCRIBER_RECHECK_AGE
+    )
 
-def load_config() -> dict:
-    """Load configuration from environment variables and return them as a dict.
+
+async def _set_subscriber(bot_data: dict, user_id: int, status: str) -> None:
+    """Record the user's status in the set of known subscribers.
+
+    Subscribed users are added, or have their confirmation time refreshed;
+    everybody else is removed.
+    """
+    subscribed = _is_subscribed(status)
+    now = int(time.time())
+    redis_client = bot_data.get("redis")
+    if redis_client is not None:
+        key = _subscribers_key(bot_data)
+        try:
+            if subscribed:
+                await redis_client.zadd(key, {user_id: now})
+            else:
+                await redis_client.zrem(key, user_id)
+        except RedisError as exc:
+            logger.warning("Redis update failed for user %s: %s", user_id, exc)
+        return
+
+    subscribers = bot_data["subscribers"]
+    if subscribed:
+        subscribers[user_id] = now
+    elif subscribers.pop(user_id, None) is None:
+        # Neither known before nor now, so there is nothing to save.
+        return
+
+    db = bot_data.get("db")
+    if db is not None:
+        try:
+            await db.execute(
+                "INSERT OR REPLACE INTO subscribers VALUES (?, ?, ?, ?)",
+                (str(bot_data["config"].target_chat_id), user_id, str(status), now),
+            )
+            await db.commit()
+        except aiosqlite.Error as exc:
+            # Not fatal: the in-memory set is still up to date.
+            logger.warning("Could not save subscriber %s: %s", user_id, exc)
+
+
+def _material_fingerprint(token: str, name: str, stat: os.stat_result) -> str:
+    """Identify one version of the material file uploaded by one bot.
+
+    A file_id saved for an older version of the file must never be reused,
+    and file_ids are only valid for the bot that uploaded the file, hence the
+    bot ID (the part of the token before the colon) in front.
+    """
+    return f"{token.split(':')[0]}:{name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Bot configuration, loaded once at startup by :func:`load_config`."""
+
+    token: str
+    target_chat_id: Union[int, str]
+    material_text: Optional[str]
+    material_file_path: Optional[Path]
+    has_material_file: bool
+    material_bytes: Optional[bytes]
+    material_filename: Optional[str]
+    material_fingerprint: Optional[str]
+    material_preload_limit: int
+    file_id_cache_path: Path
+    subscribers_db_path: Path
+    channel_invite_link: Optional[str]
+    redis_url: Optional[str]
+    connection_pool_size: int
+    pool_timeout: float
+    public_url: Optional[str]
+    port: int
+    webhook_secret: Optional[str]
+
+
+def load_config() -> Config:
+    """Load configuration from environment variables and return it.
 
     If a .env file exists in the current directory, python-dotenv will load
     variables from it into os.environ.  Required variables must be
@@ -83,49 +427,103 @@ def load_config() -> dict:
 
     Returns
     -------
-    dict
-        A dictionary containing configuration values.
+    Config
+        An immutable object containing configuration values.
     """
     # Load variables from .env if present.  This call silently does nothing
     # if there is no .env file.
     load_dotenv()
 
-    config = {
-        "token": os.getenv("TELEGRAM_BOT_TOKEN"),
-        "target_chat_id": os.getenv("TARGET_CHAT_ID"),
-        "material_text": os.getenv("MATERIAL_TEXT"),
-        "material_file_path": os.getenv("MATERIAL_FILE_PATH"),
-        "channel_invite_link": os.getenv("CHANNEL_INVITE_LINK"),
-    }
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    target_chat_id = os.getenv("TARGET_CHAT_ID")
+    material_text = os.getenv("MATERIAL_TEXT")
+    material_file_path = os.getenv("MATERIAL_FILE_PATH")
+    redis_url = os.getenv("REDIS_URL")
 
-    if not config["token"]:
+    if not token:
         raise RuntimeError(
             "TELEGRAM_BOT_TOKEN must be set as an environment variable or in .env"
         )
-    if not config["target_chat_id"]:
+    if not target_chat_id:
         raise RuntimeError(
             "TARGET_CHAT_ID must be set as an environment variable or in .env"
         )
-    if not (config["material_text"] or config["material_file_path"]):
+    if not (material_text or material_file_path):
         raise RuntimeError(
             "Either MATERIAL_TEXT or MATERIAL_FILE_PATH must be set to deliver material"
         )
+    if redis_url and aioredis is None:
+        raise RuntimeError(
+            "REDIS_URL is set but the redis package is not installed (pip install redis)"
+        )
+
+    try:
+        connection_pool_size = int(os.getenv("CONNECTION_POOL_SIZE", "32"))
+        pool_timeout = float(os.getenv("POOL_TIMEOUT", "10.0"))
+        port = int(os.getenv("PORT", "8443"))
+        material_preload_limit = int(
+            os.getenv("MATERIAL_PRELOAD_LIMIT", str(20 * 1024 * 1024))
+        )
+    except ValueError as exc:
+        raise RuntimeError(
+            "CONNECTION_POOL_SIZE, PORT and MATERIAL_PRELOAD_LIMIT must be integers "
+            "and POOL_TIMEOUT a number"
+        ) from exc
 
     # Convert target chat ID to int if it looks like an integer.  Telegram
     # channel IDs are often large negative numbers (e.g. -1001234567890).
-    try:
-        config["target_chat_id"] = int(config["target_chat_id"])
-    except ValueError:
-        # It may be a string like "@channel_username", which the API will
-        # accept directly.
-        pass
+    # Anything else may be a string like "@channel_username", which the API
+    # will accept directly.
+    if target_chat_id.removeprefix("-").isdigit():
+        target_chat_id = int(target_chat_id)
 
-    # Normalize file path if provided
-    file_path = config["material_file_path"]
-    if file_path:
-        config["material_file_path"] = Path(file_path).expanduser()
+    # Normalize file path if provided.  The material is static, so read it
+    # into memory once here rather than re-opening the file on every /get,
+    # unless it is larger than MATERIAL_PRELOAD_LIMIT bytes.  Large files are
+    # read asynchronously when they are sent instead.
+    material_bytes = None
+    material_filename = None
+    material_fingerprint = None
+    if material_file_path:
+        material_file_path = Path(material_file_path).expanduser()
+        # Checked once here so that a wrong path is reported at startup
+        # rather than by a failing /get.
+        if not material_file_path.is_file():
+            raise RuntimeError(
+                f"MATERIAL_FILE_PATH does not point to a file: {material_file_path}"
+            )
+        stat = material_file_path.stat()
+        if stat.st_size <= material_preload_limit:
+            material_bytes = material_file_path.read_bytes()
+        material_filename = material_file_path.name
+        material_fingerprint = _material_fingerprint(token, material_filename, stat)
+    else:
+        material_file_path = None
 
-    return config
+    return Config(
+        token=token,
+        target_chat_id=target_chat_id,
+        material_text=material_text,
+        material_file_path=material_file_path,
+        has_material_file=material_file_path is not None,
+        material_bytes=material_bytes,
+        material_filename=material_filename,
+        material_fingerprint=material_fingerprint,
+        material_preload_limit=material_preload_limit,
+        file_id_cache_path=Path(
+            os.getenv("FILE_ID_CACHE_PATH", "material_file_id.json")
+        ).expanduser(),
+        subscribers_db_path=Path(
+            os.getenv("SUBSCRIBERS_DB_PATH", "subscribers.sqlite3")
+        ).expanduser(),
+        channel_invite_link=os.getenv("CHANNEL_INVITE_LINK"),
+        redis_url=redis_url,
+        connection_pool_size=connection_pool_size,
+        pool_timeout=pool_timeout,
+        public_url=(os.getenv("PUBLIC_URL") or "").rstrip("/") or None,
+        port=port,
+        webhook_secret=os.getenv("WEBHOOK_SECRET"),
+    )
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -137,45 +535,165 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(msg)
 
 
+# Transient network errors are retried this many times in total, waiting
+# RETRY_BASE_DELAY * 2**attempt seconds between attempts.
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+
+
+async def _call_with_retry(
+    coro_factory,
+    attempts: int = RETRY_ATTEMPTS,
+    base: float = RETRY_BASE_DELAY,
+    idempotent: bool = False,
+):
+    """Await ``coro_factory()``, retrying on network errors.
+
+    ``coro_factory`` must create a new coroutine on every call, e.g.
+    ``lambda: bot.send_message(...)``.  BadRequest is a subclass of
+    NetworkError, but it means Telegram rejected the request itself, so it
+    is raised immediately instead of being retried.  TimedOut is only
+    retried for ``idempotent`` requests: a request that timed out may still
+    have been carried out, and repeating a send would deliver it twice.
+    """
+    for attempt in range(attempts):
+        try:
+            return await coro_factory()
+        except BadRequest:
+            raise
+        except TimedOut:
+            if not idempotent or attempt == attempts - 1:
+                raise
+            delay = base * 2**attempt
+            logger.info("Telegram request timed out; retrying in %.1fs", delay)
+            await asyncio.sleep(delay)
+        except NetworkError as exc:
+            if attempt == attempts - 1:
+                raise
+            delay = base * 2**attempt
+            logger.info("Telegram request failed (%s); retrying in %.1fs", exc, delay)
+            await asyncio.sleep(delay)
+
+
+# Error messages of get_chat_member meaning that the user isn't in the chat.
+_USER_NOT_FOUND_ERRORS = ("user not found", "participant_id_invalid")
+
+
+def _is_user_not_found(exc: BadRequest) -> bool:
+    """Return True if a BadRequest says that the user isn't in the chat."""
+    message = exc.message.lower()
+    return any(error in message for error in _USER_NOT_FOUND_ERRORS)
+
+
+def _start_shared(registry: dict, key, coro_factory) -> Tuple[asyncio.Task, bool]:
+    """Return the task stored under ``key`` in ``registry``, starting it if needed.
+
+    The work runs in a task of its own that callers await through
+    :func:`asyncio.shield`, so cancelling any caller, including the one that
+    started it, never cancels the work for the others.  The task removes
+    itself from ``registry`` when it is done.  Returns the task and whether
+    this call started it.
+    """
+    task = registry.get(key)
+    if task is not None:
+        return task, False
+
+    task = asyncio.create_task(coro_factory())
+    registry[key] = task
+
+    def _done(finished: asyncio.Task) -> None:
+        if registry.get(key) is finished:
+            del registry[key]
+        # Mark a failure as retrieved even if every caller was cancelled.
+        if not finished.cancelled():
+            finished.exception()
+
+    task.add_done_callback(_done)
+    return task, True
+
+
+async def _get_chat_member_status(bot, target_chat_id, user_id: int) -> str:
+    """Ask Telegram for the user's status in the target chat."""
+    # get_chat_member returns a ChatMember instance.  The status property
+    # indicates the user’s relationship to the chat: member, administrator,
+    # owner, left, banned, restricted, etc.
+    try:
+        chat_member = await _call_with_retry(
+            lambda: bot.get_chat_member(target_chat_id, user_id),
+            idempotent=True,
+        )
+        return chat_member.status
+    except BadRequest as exc:
+        # "User not found" means the user has never been in the chat, so
+        # they are definitely not subscribed.  Any other BadRequest (e.g.
+        # "chat not found", or the bot isn't an administrator) says nothing
+        # about the user and must not be cached as "not subscribed", so let
+        # it reach the caller.
+        if not _is_user_not_found(exc):
+            raise
+        if _DEBUG:
+            logger.debug("get_chat_member failed for %s: %s", user_id, exc)
+        return ChatMemberStatus.LEFT
+
+
+async def _fetch_status(bot, bot_data: dict, target_chat_id, user_id: int) -> str:
+    """Ask Telegram for the user's status in the target chat.
+
+    Concurrent lookups for the same user share a single get_chat_member
+    call, kept in bot_data["inflight"] while it runs.
+    """
+    task, _ = _start_shared(
+        bot_data["inflight"],
+        user_id,
+        lambda: _get_chat_member_status(bot, target_chat_id, user_id),
+    )
+    return await asyncio.shield(task)
+
+
 async def get_material(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Check subscription and send the material if the user is subscribed."""
     user_id = update.effective_user.id
-    config = context.application.bot_data.get("config")
-    target_chat_id = config["target_chat_id"]
-    material_text: Optional[str] = config.get("material_text")
-    material_file_path: Optional[Path] = config.get("material_file_path")
-    channel_invite_link: Optional[str] = config.get("channel_invite_link")
+    config: Config = context.application.bot_data["config"]
+    target_chat_id = config.target_chat_id
 
+    bot_data = context.application.bot_data
     try:
-        # get_chat_member returns a ChatMember instance.  The status property
-        # indicates the user’s relationship to the chat: member, administrator,
-        # owner, left, banned, restricted, etc.
-        chat_member = await context.bot.get_chat_member(target_chat_id, user_id)
-        status = chat_member.status
-        logger.debug(
-            "User %s has status '%s' in chat %s",
-            user_id,
-            status,
-            target_chat_id,
-        )
+        if await _is_known_subscriber(bot_data, user_id):
+            subscribed = True
+        else:
+            redis_client = bot_data.get("redis")
+            status = await _get_cached_status(redis_client, target_chat_id, user_id)
+            if status is None:
+                # Asking Telegram takes a round-trip, so show a typing
+                # indicator meanwhile.  It doesn't depend on the result, so
+                # send it concurrently rather than before the lookup.
+                context.application.create_task(
+                    context.bot.send_chat_action(
+                        chat_id=user_id, action=ChatAction.TYPING
+                    ),
+                    update=update,
+                )
+                status = await _fetch_status(
+                    context.bot, bot_data, target_chat_id, user_id
+                )
+                await _cache_status(redis_client, target_chat_id, user_id, status)
+                # Adds new subscribers, refreshes ones due for a recheck and
+                # drops those who turned out to have left.
+                await _set_subscriber(bot_data, user_id, status)
+            if _DEBUG:
+                logger.debug(
+                    "User %s has status '%s' in chat %s",
+                    user_id,
+                    status,
+                    target_chat_id,
+                )
+            subscribed = _is_subscribed(status)
 
-        if status in [
-            ChatMemberStatus.MEMBER,
-            ChatMemberStatus.ADMINISTRATOR,
-            ChatMemberStatus.OWNER,
-            ChatMemberStatus.CREATOR if hasattr(ChatMemberStatus, "CREATOR") else None,
-        ]:
+        if subscribed:
             # The user is subscribed (member or admin or owner)
-            if material_file_path and material_file_path.exists():
-                # Send the file.  Open as binary and ensure closing after use.
+            if config.has_material_file:
                 try:
-                    with material_file_path.open("rb") as fh:
-                        await context.bot.send_document(
-                            chat_id=user_id,
-                            document=fh,
-                            filename=material_file_path.name,
-                            caption=material_text or None,
-                        )
+                    await _deliver(context.bot, user_id, bot_data)
                 except Exception as e:
                     logger.exception("Failed to send document: %s", e)
                     await context.bot.send_message(
@@ -184,56 +702,419 @@ async def get_material(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                     )
                 return
             # Otherwise send text
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=material_text or "Спасибо за подписку! Вот ваш материал.",
+            await _call_with_retry(
+                lambda: context.bot.send_message(
+                    chat_id=user_id,
+                    text=bot_data["reply_fallback_text"],
+                )
             )
         else:
-            # Not subscribed: inform the user.  Optionally provide invite link.
-            reply = (
-                "Чтобы получить материал, пожалуйста, подпишитесь на канал."
-            )
-            if channel_invite_link:
-                reply += f"\n{channel_invite_link}"
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=reply,
-                parse_mode=ParseMode.HTML,
+            # Not subscribed: inform the user.
+            await _call_with_retry(
+                lambda: context.bot.send_message(
+                    chat_id=user_id,
+                    text=bot_data["reply_not_subscribed"],
+                )
             )
     except Exception as exc:
-        # If get_chat_member raises an error (user not found), treat as not subscribed.
+        # Membership could not be checked even after retrying (e.g. Telegram
+        # is unreachable), so we can't tell whether the user is subscribed.
         logger.warning("Error while checking membership for user %s: %s", user_id, exc)
-        reply = (
-            "Не удалось проверить вашу подписку. Возможно, вы не подписаны на канал."
-        )
-        if channel_invite_link:
-            reply += f"\n{channel_invite_link}"
         await context.bot.send_message(
             chat_id=user_id,
-            text=reply,
+            text=bot_data["reply_check_failed"],
         )
 
 
-async def main() -> None:
-    """Entry point: set up the bot and start polling."""
+# Once the material has been uploaded, Telegram can send it again by its
+# file_id without the bot uploading anything.  The file_id is kept in
+# bot_data["material_file_id"] and saved, keyed by the material fingerprint,
+# in Redis if configured or else in FILE_ID_CACHE_PATH, so that it survives
+# restarts.
+async def _load_material_file_id(bot_data: dict) -> None:
+    """Restore a previously saved file_id for the current material."""
+    config: Config = bot_data["config"]
+    fingerprint = bot_data["material_fingerprint"]
+    if fingerprint is None:
+        return
+    file_id = None
+    redis_client = bot_data.get("redis")
+    try:
+        if redis_client is not None:
+            file_id = await redis_client.get(f"material_file_id:{fingerprint}")
+        elif config.file_id_cache_path.exists():
+            async with aiofiles.open(config.file_id_cache_path, "r") as fh:
+                saved = json.loads(await fh.read())
+            if saved.get("fingerprint") == fingerprint:
+                file_id = saved.get("file_id")
+    except (RedisError, OSError, ValueError) as exc:
+        logger.warning("Could not load the saved material file_id: %s", exc)
+        return
+    if file_id:
+        bot_data["material_file_id"] = file_id
+        logger.info("Reusing the saved file_id of %s", config.material_filename)
+
+
+async def _save_material_file_id(
+    bot_data: dict, file_id: str, fingerprint: str
+) -> None:
+    """Remember the file_id of the uploaded material, also across restarts.
+
+    ``fingerprint`` identifies the version of the file that was uploaded.
+    If the file has changed since the upload started, the file_id belongs to
+    the old version and is not saved.
+    """
+    if fingerprint != bot_data["material_fingerprint"]:
+        logger.info("Not saving the file_id of an outdated version of the material")
+        return
+    bot_data["material_file_id"] = file_id
+    config: Config = bot_data["config"]
+    redis_client = bot_data.get("redis")
+    try:
+        if redis_client is not None:
+            await redis_client.set(f"material_file_id:{fingerprint}", file_id)
+        else:
+            # Write to a temporary file and rename it over the old one, so
+            # that the file is always either the old or the new version.
+            saved = {"fingerprint": fingerprint, "file_id": file_id}
+            path = config.file_id_cache_path
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                async with aiofiles.open(tmp_path, "w") as fh:
+                    await fh.write(json.dumps(saved))
+                await aiofiles.os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+    except (RedisError, OSError) as exc:
+        # Not fatal: the file_id is still cached in memory.
+        logger.warning("Could not save the material file_id: %s", exc)
+
+
+# Error messages of send_document meaning that Telegram doesn't accept the
+# cached file_id (any more), so the file has to be uploaded again.
+_FILE_ID_ERRORS = ("file identifier", "file_id", "file reference", "file of type")
+
+
+def _is_file_id_error(exc: BadRequest) -> bool:
+    """Return True if a BadRequest says that the file_id sent is invalid."""
+    message = exc.message.lower()
+    return any(error in message for error in _FILE_ID_ERRORS)
+
+
+# How often, in seconds, to check whether the material file has changed on
+# disk.  Checking on every /get would cost a stat() call per request.
+MATERIAL_CHECK_INTERVAL = 60
+
+
+async def _refresh_material(bot_data: dict) -> None:
+    """Forget the file_id and cached bytes if the material file has changed."""
+    now = time.monotonic()
+    if now - bot_data["material_checked_at"] < MATERIAL_CHECK_INTERVAL:
+        return
+    bot_data["material_checked_at"] = now
+
+    config: Config = bot_data["config"]
+    try:
+        stat = await asyncio.to_thread(config.material_file_path.stat)
+    except OSError as exc:
+        # Keep using what we have; the file may just be being replaced.
+        logger.warning("Could not check %s: %s", config.material_file_path, exc)
+        return
+    fingerprint = _material_fingerprint(config.token, config.material_filename, stat)
+    if fingerprint == bot_data["material_fingerprint"]:
+        return
+    logger.info("%s has changed; it will be uploaded again", config.material_filename)
+    bot_data["material_fingerprint"] = fingerprint
+    bot_data["material_bytes"] = None
+    bot_data.pop("material_file_id", None)
+
+
+async def _deliver(bot, user_id: int, bot_data: dict) -> None:
+    """Send the material file to a user, as cheaply as possible.
+
+    The cached file_id is tried first, since it costs no upload at all.  If
+    Telegram rejects it as invalid, or there is none yet, the file is
+    uploaded from the copy in memory, or read from disk if there is none.
+    The file_id of a successful upload is remembered for next time.  Only
+    one upload runs at a time: concurrent requests wait for its file_id.
+    """
+    config: Config = bot_data["config"]
+    caption = config.material_text or None
+    await _refresh_material(bot_data)
+
+    file_id = bot_data.get("material_file_id")
+    if file_id:
+        try:
+            await _call_with_retry(
+                lambda: bot.send_document(
+                    chat_id=user_id, document=file_id, caption=caption
+                )
+            )
+            return
+        except BadRequest as exc:
+            # Other errors, e.g. a caption that is too long, would fail an
+            # upload just the same, so don't throw the file_id away for them.
+            if not _is_file_id_error(exc):
+                raise
+            logger.warning("Cached file_id was rejected (%s); uploading again", exc)
+            if bot_data.get("material_file_id") == file_id:
+                del bot_data["material_file_id"]
+
+    # Only one upload runs at a time.  Requests arriving while it runs wait
+    # for its file_id and send that instead of uploading the file again.
+    upload, started = _start_shared(
+        bot_data,
+        "material_upload",
+        lambda: _upload_material(bot, user_id, bot_data),
+    )
+    file_id = await asyncio.shield(upload)
+    if started:
+        return
+    await _call_with_retry(
+        lambda: bot.send_document(chat_id=user_id, document=file_id, caption=caption)
+    )
+
+
+async def _upload_material(bot, user_id: int, bot_data: dict) -> str:
+    """Upload the material file to a user and return its new file_id.
+
+    The copy in memory is used if there is one; otherwise the file is read
+    from disk.
+    """
+    config: Config = bot_data["config"]
+    caption = config.material_text or None
+    # Note which version is being uploaded before anything is awaited, in
+    # case _refresh_material notices a change while the upload runs.
+    fingerprint = bot_data["material_fingerprint"]
+    document = bot_data["material_bytes"]
+    if document is None:
+        # Read the file without blocking the event loop.  Keep it in memory
+        # for the next upload unless it is too large for that.
+        async with aiofiles.open(config.material_file_path, "rb") as fh:
+            document = await fh.read()
+        if (
+            len(document) <= config.material_preload_limit
+            and fingerprint == bot_data["material_fingerprint"]
+        ):
+            bot_data["material_bytes"] = document
+    message = await _call_with_retry(
+        lambda: bot.send_document(
+            chat_id=user_id,
+            document=document,
+            filename=config.material_filename,
+            caption=caption,
+        )
+    )
+    await _save_material_file_id(bot_data, message.document.file_id, fingerprint)
+    return message.document.file_id
+
+
+def _is_target_chat(chat, target_chat_id) -> bool:
+    """Return True if chat is the one configured by TARGET_CHAT_ID."""
+    if isinstance(target_chat_id, int):
+        return chat.id == target_chat_id
+    return bool(chat.username) and f"@{chat.username}".lower() == target_chat_id.lower()
+
+
+async def load_administrators(application: Application) -> None:
+    """Seed the set of known subscribers with the chat's administrators.
+
+    Everybody else is added the first time they use /get or when a
+    chat_member update arrives for them.
+    """
+    bot_data = application.bot_data
+    target_chat_id = bot_data["config"].target_chat_id
+    try:
+        administrators = await application.bot.get_chat_administrators(target_chat_id)
+    except Exception as exc:
+        logger.warning("Could not load administrators of %s: %s", target_chat_id, exc)
+        return
+    for admin in administrators:
+        await _set_subscriber(bot_data, admin.user.id, admin.status)
+    logger.info("Loaded %d administrators of %s", len(administrators), target_chat_id)
+
+
+async def post_init(application: Application) -> None:
+    """Set up what needs a running event loop, before updates are handled."""
+    bot_data = application.bot_data
+    config: Config = bot_data["config"]
+
+    # Share the membership cache between workers through Redis if
+    # configured; otherwise remember known subscribers in SQLite.
+    if config.redis_url:
+        bot_data["redis"] = aioredis.from_url(config.redis_url, decode_responses=True)
+    else:
+        bot_data["db"] = await _open_subscribers_db(bot_data)
+
+    await _load_material_file_id(bot_data)
+    await load_administrators(application)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Close the connections opened by :func:`post_init`."""
+    redis_client = application.bot_data.pop("redis", None)
+    if redis_client is not None:
+        await redis_client.aclose()
+    db = application.bot_data.pop("db", None)
+    if db is not None:
+        await db.close()
+
+
+async def on_chat_member_update(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Track membership changes that Telegram pushes to the bot.
+
+    ``chat_member`` updates concern a single user: the set of known
+    subscribers is updated from the new status and the user's cached status
+    is invalidated.  ``my_chat_member`` updates mean the bot's own rights in
+    a chat changed, which may affect every check, so the whole cache goes.
+    When the cache lives in Redis the changes are visible to all workers.
+    """
+    bot_data = context.application.bot_data
+    redis_client = bot_data.get("redis")
+    target_chat_id = bot_data["config"].target_chat_id
+    if update.chat_member is not None:
+        if not _is_target_chat(update.chat_member.chat, target_chat_id):
+            return
+        new_member = update.chat_member.new_chat_member
+        user_id = new_member.user.id
+        await _set_subscriber(bot_data, user_id, new_member.status)
+        await _invalidate_status(redis_client, target_chat_id, user_id)
+        if _DEBUG:
+            logger.debug(
+                "User %s now has status '%s' in chat %s",
+                user_id,
+                new_member.status,
+                target_chat_id,
+            )
+    elif update.my_chat_member is not None:
+        # Also sent when a user blocks the bot in a private chat or the bot
+        # joins another group; only the target chat matters here.
+        if not _is_target_chat(update.my_chat_member.chat, target_chat_id):
+            return
+        await _invalidate_status(redis_client, target_chat_id)
+        logger.info("Bot membership changed; membership cache cleared")
+
+
+def main() -> None:
+    """Entry point: set up the bot and start polling or serving webhooks.
+
+    run_polling and run_webhook start and stop the event loop themselves, so
+    this function is synchronous.  Setup and cleanup that need the loop run
+    in :func:`post_init` and :func:`post_shutdown`.
+    """
     config = load_config()
+
+    # Use separate connection pools for outgoing API calls and for the
+    # long-polling getUpdates request, so that polling can never starve
+    # send_message/send_document of connections under load.  Outgoing calls
+    # use HTTP/2 and keep idle connections alive for a minute, so that most
+    # requests are multiplexed over an existing TLS connection instead of
+    # paying for a new handshake.
+    request = HTTPXRequest(
+        connection_pool_size=config.connection_pool_size,
+        pool_timeout=config.pool_timeout,
+        http_version="2",
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=config.connection_pool_size,
+                max_keepalive_connections=config.connection_pool_size,
+                keepalive_expiry=60.0,
+            ),
+        },
+    )
+    get_updates_request = HTTPXRequest(
+        connection_pool_size=4,
+        pool_timeout=config.pool_timeout,
+    )
     application: Application = (
-        ApplicationBuilder().token(config["token"]).build()
+        ApplicationBuilder()
+        .token(config.token)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        # Stay just below Telegram's limit of 30 messages per second.  Under a
+        # burst, requests wait their turn instead of failing with RetryAfter,
+        # and any RetryAfter that still happens is retried up to 3 times.
+        .rate_limiter(
+            AIORateLimiter(overall_max_rate=28, overall_time_period=1, max_retries=3)
+        )
+        # Handlers mostly wait on the network, so let updates from different
+        # users be processed concurrently rather than one after another.
+        .defaults(Defaults(block=False))
+        .concurrent_updates(256)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
     )
 
     # Store configuration in application.bot_data so handlers can access it
     application.bot_data["config"] = config
+    application.bot_data["subscribers"] = {}
+    application.bot_data["inflight"] = {}
+    # The material may change on disk while the bot runs, so keep the
+    # current state of it in bot_data rather than in the frozen config.
+    application.bot_data["material_bytes"] = config.material_bytes
+    application.bot_data["material_fingerprint"] = config.material_fingerprint
+    application.bot_data["material_checked_at"] = time.monotonic()
+
+    # The replies depend only on the configuration, so build them once.  They
+    # are sent as plain text, so the invite link needs no escaping.
+    reply_not_subscribed = "Чтобы получить материал, пожалуйста, подпишитесь на канал."
+    reply_check_failed = (
+        "Не удалось проверить вашу подписку. Возможно, вы не подписаны на канал."
+    )
+    if config.channel_invite_link:
+        reply_not_subscribed += f"\n{config.channel_invite_link}"
+        reply_check_failed += f"\n{config.channel_invite_link}"
+    application.bot_data["reply_not_subscribed"] = reply_not_subscribed
+    application.bot_data["reply_check_failed"] = reply_check_failed
+    application.bot_data["reply_fallback_text"] = (
+        config.material_text or "Спасибо за подписку! Вот ваш материал."
+    )
 
     # Register command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("get", get_material))
+    application.add_handler(
+        ChatMemberHandler(on_chat_member_update, ChatMemberHandler.ANY_CHAT_MEMBER)
+    )
 
-    logger.info("Bot started. Waiting for commands…")
-    await application.run_polling()
+    # chat_member updates are only delivered when explicitly requested.
+    allowed_updates = ["message", "chat_member", "my_chat_member"]
+    if config.public_url:
+        # Let Telegram push updates to us instead of holding a getUpdates
+        # connection open.  The token in the URL path keeps strangers from
+        # posting fake updates.
+        logger.info(
+            "Bot started. Listening for webhook updates on port %d…",
+            config.port,
+        )
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=config.port,
+            url_path=config.token,
+            webhook_url=f"{config.public_url}/{config.token}",
+            secret_token=config.webhook_secret,
+            allowed_updates=allowed_updates,
+        )
+    else:
+        logger.info("Bot started. Waiting for commands…")
+        application.run_polling(allowed_updates=allowed_updates)
 
 
 if __name__ == "__main__":
+    # uvloop is a faster drop-in replacement for the default event loop.  It
+    # isn't available on Windows, and the bot works fine without it.
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            uvloop.install()
     try:
-        asyncio.run(main())
+        main()
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped")